@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import StoplightGroup, Stoplight
+from .models import StoplightGroup, Stoplight, ActivationEvent
 
 # Register your models here.
 admin.site.register(StoplightGroup)
 admin.site.register(Stoplight)
+admin.site.register(ActivationEvent)
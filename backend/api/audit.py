@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from .models import ActivationEvent
+
+logger = logging.getLogger(__name__)
+
+
+class ActivationLogWriter:
+    """
+    Batches activation events in memory and writes them with bulk_create from a background task.
+
+    `log()` only appends to an asyncio queue, so consumers never wait on the database.
+    The queue is flushed when it holds `batch_size` events or every `flush_interval`
+    seconds, whichever comes first. When the queue is full, new events are dropped
+    and counted instead of blocking the caller.
+
+    `close()` writes everything still queued and is called on ASGI lifespan shutdown.
+    Servers without lifespan support (daphne) lose up to `flush_interval` seconds of
+    events when the process stops.
+    """
+
+    # Dedicated thread for bulk inserts, so they never queue behind sync views and
+    # session loads on asgiref's shared thread-sensitive executor
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="activation-log")
+
+    def __init__(self, batch_size=500, flush_interval=0.5, max_queue_size=50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.queue = None
+        self.task = None
+        self.batch = []  # Events taken off the queue but not yet written
+        self.closing = False
+        self.dropped = 0
+
+    def log(self, group_id, stoplight_id, activate, vehicle="", connection="", source=""):
+        """
+        Queue an activation event. Must be called from the event loop thread.
+        """
+        self.ensure_started()
+        event = ActivationEvent(
+            group_id=group_id,
+            stoplight_id=stoplight_id,
+            activate=bool(activate),
+            vehicle=vehicle,
+            connection=connection,
+            source=source,
+            timestamp=timezone.now(),
+        )
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning("Activation log queue full, %d events dropped so far.", self.dropped)
+
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self.closing = False
+            self.task = loop.create_task(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while not self.closing:
+            self.batch.append(await self.queue.get())
+            deadline = loop.time() + self.flush_interval
+
+            # Keep collecting until the batch is full or the flush interval elapses
+            while len(self.batch) < self.batch_size and not self.closing:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self.batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if self.closing:
+                break  # close() writes the batch in progress
+
+            batch, self.batch = self.batch, []
+            try:
+                await self.write(batch)
+            except Exception:
+                logger.exception("Failed to write %d activation events.", len(batch))
+
+    async def close(self):
+        """
+        Stop the background task and write the batch in progress and everything still queued.
+        """
+        # wait_for() can swallow the cancellation when a queued event arrives at the
+        # same time, so run() also checks the closing flag before going back to wait
+        self.closing = True
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+        batch, self.batch = self.batch, []
+        while self.queue is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self.write(batch)
+
+    async def write(self, batch):
+        await database_sync_to_async(self.write_sync, thread_sensitive=False, executor=self.executor)(batch)
+
+    def write_sync(self, batch):
+        ActivationEvent.objects.bulk_create(batch, batch_size=self.batch_size)
+
+
+activation_log = ActivationLogWriter(
+    batch_size=getattr(settings, "ACTIVATION_LOG_BATCH_SIZE", 500),
+    flush_interval=getattr(settings, "ACTIVATION_LOG_FLUSH_INTERVAL_MS", 500) / 1000,
+)
@@ -1,26 +1,58 @@
 import json
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from geopy.distance import geodesic
+from django.conf import settings
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from .audit import activation_log
+from .live_status import OPERATOR_GROUP, live_status
+from .models import StoplightGroup
+from .proximity import update_active_groups
+from .traces import TraceRecorder
+
+
+class ProximityConsumer(AsyncWebsocketConsumer):
+    """
+    Base consumer that activates the closest stoplight of a group when the vehicle enters its radius.
+    Subclasses extract the current location from incoming messages.
+    """
+    name = "Proximity"
+    source = ""
 
-class SimulationConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         await self.accept()
         self.active_groups = set()  # Track active stoplight groups for the simulation
 
-        # Retrieve stoplight groups and closest stoplights from the session
-        self.stoplight_groups = self.scope["session"].get("stoplight_groups", [])
-        self.closest_stoplights = self.scope["session"].get("closest_stoplights", {})
+        # Retrieve stoplight groups and closest stoplights from the signed route token,
+        # falling back to the session for clients that connect without one
+        route_plan = self.scope.get("route_plan") or self.scope["session"]
+        self.stoplight_groups = route_plan.get("stoplight_groups", [])
+        self.closest_stoplights = route_plan.get("closest_stoplights", {})
 
+        # Stable vehicle ID generated by the client, blank for clients that send none
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.vehicle = query.get("vehicle", [""])[0][:64]
 
-        print("Simulation WebSocket connection established.")
+        # Opt-in recording of the session's fixes and commands for replay
+        self.recorder = None
+        if settings.TRACE_RECORDING_DIR:
+            self.recorder = TraceRecorder.create(
+                settings.TRACE_RECORDING_DIR, self.source, self.stoplight_groups, self.closest_stoplights
+            )
+
+        print(f"{self.name} WebSocket connection established.")
 
     async def disconnect(self, close_code):
-        print("Simulation WebSocket connection closed.")
+        print(f"{self.name} WebSocket connection closed.")
         # Deactivate all stoplights when the WebSocket disconnects
         await self.deactivate_all_stoplights()
 
+        live_status.remove_vehicle(self.channel_name)
+
+        if self.recorder:
+            self.recorder.close()
+
     async def receive(self, text_data):
         data = json.loads(text_data)
 
@@ -30,211 +62,108 @@ class SimulationConsumer(AsyncWebsocketConsumer):
             await self.deactivate_all_stoplights()
             return
 
-        coordinates = data.get("coordinates")
-        if not coordinates:
+        current_location = self.get_location(data)
+        if current_location is None:
             return
 
+        if self.recorder:
+            self.recorder.record_fix(*current_location)
+
+        live_status.update_vehicle(self.channel_name, self.vehicle, self.source, *current_location)
 
-        # Check proximity to stoplight groups
-        current_location = (coordinates["lat"], coordinates["lng"])
-        channel_layer = get_channel_layer()
-
-        for group in self.stoplight_groups:
-            group_id = group["groupID"]
-            group_location = (group["lat"], group["lng"])
-            distance_to_group = geodesic(current_location, group_location).meters
-
-            if distance_to_group <= 100:
-                if group_id not in self.active_groups:
-                    # Entering the radius
-                    self.active_groups.add(group_id)
-
-                    # Get the precomputed closest stoplight for this group
-                    closest_stoplight = self.closest_stoplights.get(str(group_id))
-
-                    if closest_stoplight:
-                        message = {
-                            "activate": 1,
-                            "groupID": group_id,
-                            "stoplightID": closest_stoplight["stoplightID"],
-                        }
-
-                        # Send to frontend WebSocket
-                        await self.send(text_data=json.dumps(message))
-
-                        await channel_layer.group_send(
-                            "esp32_group",
-                            {"type": "broadcast_message", "message": message},
-                        )
-
-            else:
-                if group_id in self.active_groups:
-                    # Exiting the radius
-                    self.active_groups.remove(group_id)
-
-                    # Deactivate the previously active stoplight in this group
-                    closest_stoplight = self.closest_stoplights.get(str(group_id))
-                    if closest_stoplight:
-                        message = {
-                            "activate": 0,
-                            "groupID": group_id,
-                            "stoplightID": closest_stoplight["stoplightID"],
-                        }
-
-                        # Send to frontend WebSocket
-                        await self.send(text_data=json.dumps(message))
-
-                        await channel_layer.group_send(
-                            "esp32_group",
-                            {"type": "broadcast_message", "message": message},
-                        )
+        await self.check_proximity(current_location)
+
+    def get_location(self, data):
+        """
+        Return the (lat, lng) tuple carried by a message, or None if it has no usable location.
+        """
+        raise NotImplementedError
+
+    async def check_proximity(self, current_location):
+        # Check proximity to stoplight groups and toggle the precomputed closest stoplights
+        changes = update_active_groups(current_location, self.stoplight_groups, self.active_groups)
+        for group_id, activate in changes:
+            await self.send_stoplight_command(group_id, activate)
 
     async def deactivate_all_stoplights(self):
         """
         Deactivate all active stoplights and notify the frontend and ESP32 WebSocket group.
         """
-        channel_layer = get_channel_layer()
-
         for group_id in list(self.active_groups):  # Use a copy of the set to avoid modification during iteration
             self.active_groups.remove(group_id)
 
             # Deactivate the stoplight for this group
-            closest_stoplight = self.closest_stoplights.get(str(group_id))
-            if closest_stoplight:
-                message = {
-                    "activate": 0,
-                    "groupID": group_id,
-                    "stoplightID": closest_stoplight["stoplightID"],
-                }
-
-                # Send to frontend WebSocket
-                await self.send(text_data=json.dumps(message))
-
-                # Broadcast to ESP32 WebSocket group
-                await channel_layer.group_send(
-                    "esp32_group",
-                    {"type": "broadcast_message", "message": message},
-                )
-    
-
-class LiveSimulationConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        await self.accept()
+            await self.send_stoplight_command(group_id, 0)
 
-        self.active_groups = set()  # Track active stoplight groups for the simulation
+        if self.recorder:
+            self.recorder.record_end()
 
-        # Retrieve stoplight groups and closest stoplights from the session
-        self.stoplight_groups = self.scope["session"].get("stoplight_groups", [])
-        self.closest_stoplights = self.scope["session"].get("closest_stoplights", {})
+    async def send_stoplight_command(self, group_id, activate):
+        """
+        Send an activate/deactivate command for the closest stoplight of a group
+        to the frontend and the ESP32 WebSocket group, and record it in the activation log.
+        """
+        closest_stoplight = self.closest_stoplights.get(str(group_id))
+        if not closest_stoplight:
+            return
 
-        print("LiveSimulation WebSocket connection established.")
+        message = {
+            "activate": activate,
+            "groupID": group_id,
+            "stoplightID": closest_stoplight["stoplightID"],
+        }
 
-    async def disconnect(self, close_code):
-        print("LiveSimulation WebSocket connection closed.")
-        # Deactivate all stoplights when the WebSocket disconnects
-        await self.deactivate_all_stoplights()
+        # Send to frontend WebSocket
+        await self.send(text_data=json.dumps(message))
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+        # Broadcast to ESP32 WebSocket group
+        await get_channel_layer().group_send(
+            "esp32_group",
+            {"type": "broadcast_message", "message": message},
+        )
 
-        # Handle "end_simulation" message
-        if data.get("end_simulation"):
-            print("End of simulation received. Deactivating all stoplights.")
-            await self.deactivate_all_stoplights()
-            return
+        if self.recorder:
+            self.recorder.record_command(group_id, closest_stoplight["stoplightID"], activate)
 
-        lat = data.get("lat")
-        lng = data.get("lng")
+        live_status.update_stoplight(group_id, closest_stoplight["stoplightID"], self.channel_name, activate)
 
-        if lat is None or lng is None:
-            return
+        # Queued for the background writer, never blocks on the database
+        activation_log.log(
+            group_id, closest_stoplight["stoplightID"], activate,
+            vehicle=self.vehicle, connection=self.channel_name, source=self.source,
+        )
 
-        try:
-            current_location = (float(lat), float(lng))
-        except ValueError:
-            return
 
-        # Check proximity to stoplight groups
-        channel_layer = get_channel_layer()
-
-        for group in self.stoplight_groups:
-            group_id = group["groupID"]
-            group_location = (group["lat"], group["lng"])
-            distance_to_group = geodesic(current_location, group_location).meters
-
-            if distance_to_group <= 100:
-                if group_id not in self.active_groups:
-                    # Entering the radius
-                    self.active_groups.add(group_id)
-
-                    # Get the precomputed closest stoplight for this group
-                    closest_stoplight = self.closest_stoplights.get(str(group_id))
-
-                    if closest_stoplight:
-                        message = {
-                            "activate": 1,
-                            "groupID": group_id,
-                            "stoplightID": closest_stoplight["stoplightID"],
-                        }
-
-                        # Send to frontend WebSocket
-                        await self.send(text_data=json.dumps(message))
-
-                        # Send to ESP32 WebSocket group
-                        await channel_layer.group_send(
-                            "esp32_group",
-                            {"type": "broadcast_message", "message": message},
-                        )
-
-            else:
-                if group_id in self.active_groups:
-                    # Exiting the radius
-                    self.active_groups.remove(group_id)
-
-                    # Deactivate the previously active stoplight in this group
-                    closest_stoplight = self.closest_stoplights.get(str(group_id))
-                    if closest_stoplight:
-                        message = {
-                            "activate": 0,
-                            "groupID": group_id,
-                            "stoplightID": closest_stoplight["stoplightID"],
-                        }
-
-                        # Send to frontend WebSocket
-                        await self.send(text_data=json.dumps(message))
-
-                        # Send to ESP32 WebSocket group
-                        await channel_layer.group_send(
-                            "esp32_group",
-                            {"type": "broadcast_message", "message": message},
-                        )
+class SimulationConsumer(ProximityConsumer):
+    name = "Simulation"
+    source = "simulation"
 
-    async def deactivate_all_stoplights(self):
-        """
-        Deactivate all active stoplights and notify the frontend and ESP32 WebSocket group.
-        """
-        channel_layer = get_channel_layer()
+    def get_location(self, data):
+        coordinates = data.get("coordinates")
+        if not coordinates:
+            return None
 
-        for group_id in list(self.active_groups):  # Use a copy of the set to avoid modification during iteration
-            self.active_groups.remove(group_id)
+        try:
+            return (float(coordinates["lat"]), float(coordinates["lng"]))
+        except (KeyError, TypeError, ValueError):
+            return None
 
-            # Deactivate the stoplight for this group
-            closest_stoplight = self.closest_stoplights.get(str(group_id))
-            if closest_stoplight:
-                message = {
-                    "activate": 0,
-                    "groupID": group_id,
-                    "stoplightID": closest_stoplight["stoplightID"],
-                }
 
-                # Send to frontend WebSocket
-                await self.send(text_data=json.dumps(message))
+class LiveSimulationConsumer(ProximityConsumer):
+    name = "LiveSimulation"
+    source = "live"
 
-                # Broadcast to ESP32 WebSocket group
-                await channel_layer.group_send(
-                    "esp32_group",
-                    {"type": "broadcast_message", "message": message},
-                )
+    def get_location(self, data):
+        lat = data.get("lat")
+        lng = data.get("lng")
+
+        if lat is None or lng is None:
+            return None
+
+        try:
+            return (float(lat), float(lng))
+        except (TypeError, ValueError):
+            return None
 
 
 class ESP32Consumer(AsyncWebsocketConsumer):
@@ -252,3 +181,39 @@ class ESP32Consumer(AsyncWebsocketConsumer):
         message = event["message"]
         print(f"Broadcasting to ESP32 WebSocket: {message}")
         await self.send(text_data=json.dumps(message))
+
+
+class OperatorConsumer(AsyncWebsocketConsumer):
+    """
+    Read-only stream for dispatchers: a snapshot of every intersection and vehicle on connect,
+    then throttled deltas broadcast by the live status task. Only staff users, logged in
+    through the Django admin, may connect.
+    """
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated or not user.is_staff:
+            # Closing before accepting rejects the WebSocket handshake
+            await self.close()
+            return
+
+        await self.accept()
+        await self.channel_layer.group_add(OPERATOR_GROUP, self.channel_name)
+
+        stoplight_groups = await self.get_stoplight_groups()
+        await self.send(text_data=json.dumps(live_status.snapshot(stoplight_groups)))
+        live_status.ensure_started()
+        print("Operator WebSocket connection established.")
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(OPERATOR_GROUP, self.channel_name)
+        print("Operator WebSocket connection closed.")
+
+    async def status_delta(self, event):
+        await self.send(text_data=event["text"])
+
+    @database_sync_to_async
+    def get_stoplight_groups(self):
+        return [
+            {"groupID": group.id, "lat": group.lat, "lng": group.lng}
+            for group in StoplightGroup.objects.order_by("id")
+        ]
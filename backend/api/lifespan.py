@@ -0,0 +1,23 @@
+import logging
+from .audit import activation_log
+
+logger = logging.getLogger(__name__)
+
+
+async def lifespan_app(scope, receive, send):
+    """
+    ASGI lifespan handler that flushes the activation log before the server stops.
+    """
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            try:
+                await activation_log.close()
+            except Exception:
+                logger.exception("Failed to flush the activation log on shutdown.")
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+OPERATOR_GROUP = "operator_group"
+
+
+class LiveStatus:
+    """
+    In-process view of every intersection's active stoplights and the connected vehicles.
+
+    Consumers update it on every fix and command; changes are only marked dirty.
+    A background task sends the current state of the dirty intersections and vehicles
+    to the operator group at most `frame_rate` times per second, so operator traffic
+    depends on the frame rate rather than on the number of events.
+
+    Vehicles are keyed by the channel name of their WebSocket session, since the
+    client-supplied vehicle ID is not guaranteed to be unique between sessions.
+    """
+
+    def __init__(self, frame_rate=2):
+        if frame_rate <= 0:
+            raise ImproperlyConfigured("OPERATOR_STATUS_FRAME_RATE must be greater than 0.")
+
+        self.frame_rate = frame_rate
+        self.intersections = {}  # group ID -> {stoplight ID -> set of channel names}
+        self.vehicles = {}  # channel name -> {"id", "vehicle", "source", "lat", "lng"}
+        self.dirty_groups = set()
+        self.dirty_vehicles = set()
+        self.task = None
+
+    def update_vehicle(self, channel_name, vehicle, source, lat, lng):
+        self.ensure_started()
+        self.vehicles[channel_name] = {
+            "id": channel_name, "vehicle": vehicle, "source": source, "lat": lat, "lng": lng,
+        }
+        self.dirty_vehicles.add(channel_name)
+
+    def remove_vehicle(self, channel_name):
+        self.ensure_started()
+        if self.vehicles.pop(channel_name, None) is not None:
+            self.dirty_vehicles.add(channel_name)
+
+    def update_stoplight(self, group_id, stoplight_id, channel_name, activate):
+        self.ensure_started()
+        stoplights = self.intersections.setdefault(group_id, {})
+        if activate:
+            stoplights.setdefault(stoplight_id, set()).add(channel_name)
+        elif stoplight_id in stoplights:
+            stoplights[stoplight_id].discard(channel_name)
+            if not stoplights[stoplight_id]:
+                del stoplights[stoplight_id]
+        if not stoplights:
+            del self.intersections[group_id]
+        self.dirty_groups.add(group_id)
+
+    def intersection_state(self, group_id):
+        stoplights = self.intersections.get(group_id, {})
+        return {
+            "groupID": group_id,
+            "activeStoplights": [
+                {"stoplightID": stoplight_id, "vehicles": sorted(vehicles)}
+                for stoplight_id, vehicles in sorted(stoplights.items())
+            ],
+        }
+
+    def snapshot(self, stoplight_groups):
+        """
+        Full state for a newly connected operator. `stoplight_groups` lists every
+        intersection as {"groupID", "lat", "lng"}. Active stoplights list the `id`
+        of each vehicle holding them.
+        """
+        return {
+            "type": "snapshot",
+            "intersections": [
+                {**group, **self.intersection_state(group["groupID"])}
+                for group in stoplight_groups
+            ],
+            "vehicles": list(self.vehicles.values()),
+        }
+
+    def pop_delta(self):
+        """
+        Current state of everything that changed since the last frame, or None if nothing did.
+        Each entry carries the full state of its intersection or vehicle, so deltas can be
+        applied on top of a snapshot taken at any point.
+        """
+        if not self.dirty_groups and not self.dirty_vehicles:
+            return None
+
+        delta = {
+            "type": "delta",
+            "intersections": [self.intersection_state(group_id) for group_id in sorted(self.dirty_groups)],
+            "vehicles": [self.vehicles[v] for v in self.dirty_vehicles if v in self.vehicles],
+            "removedVehicles": [v for v in self.dirty_vehicles if v not in self.vehicles],
+        }
+        self.dirty_groups.clear()
+        self.dirty_vehicles.clear()
+        return delta
+
+    def ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+
+    async def run(self):
+        channel_layer = get_channel_layer()
+        while True:
+            await asyncio.sleep(1 / self.frame_rate)
+            delta = self.pop_delta()
+            if delta is None:
+                continue
+
+            # Serialize once for every operator instead of once per dashboard
+            try:
+                await channel_layer.group_send(
+                    OPERATOR_GROUP,
+                    {"type": "status_delta", "text": json.dumps(delta)},
+                )
+            except Exception:
+                logger.exception("Failed to broadcast operator status delta.")
+
+
+live_status = LiveStatus(frame_rate=getattr(settings, "OPERATOR_STATUS_FRAME_RATE", 2))
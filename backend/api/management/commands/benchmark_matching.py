@@ -0,0 +1,77 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from api.matching import match_groups_postgis, match_groups_python, postgis_available
+from api.models import StoplightGroup
+
+
+class Command(BaseCommand):
+    help = "Benchmark the Python and PostGIS stoplight matching backends against the same route."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--route",
+            help="JSON file with a list of [lat, lng] pairs. Defaults to a diagonal across the inventory.",
+        )
+        parser.add_argument("--points", type=int, default=500, help="Points in the generated route.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per backend.")
+
+    def handle(self, *args, **options):
+        if options["route"]:
+            with open(options["route"]) as f:
+                coordinates = json.load(f)
+        else:
+            coordinates = self.diagonal_route(options["points"])
+
+        if not coordinates:
+            raise CommandError("No route coordinates to benchmark with.")
+
+        backends = {"python": match_groups_python}
+        if postgis_available():
+            backends["postgis"] = match_groups_postgis
+        else:
+            self.stdout.write(self.style.WARNING("PostGIS geometry column not found, skipping the postgis backend."))
+
+        self.stdout.write(
+            f"Route of {len(coordinates)} points against {StoplightGroup.objects.count()} stoplight groups"
+        )
+
+        results = {}
+        for name, match_groups in backends.items():
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                groups = match_groups(coordinates)
+                timings.append(time.perf_counter() - start)
+            results[name] = [group.id for group in groups]
+            self.stdout.write(
+                f"{name:>8}: best {min(timings) * 1000:.1f} ms, "
+                f"mean {sum(timings) / len(timings) * 1000:.1f} ms, {len(groups)} groups matched"
+            )
+
+        if "postgis" in results and set(results["python"]) != set(results["postgis"]):
+            only_python = sorted(set(results["python"]) - set(results["postgis"]))
+            only_postgis = sorted(set(results["postgis"]) - set(results["python"]))
+            self.stdout.write(self.style.WARNING(
+                f"Backends disagree: only python {only_python}, only postgis {only_postgis}"
+            ))
+
+    def diagonal_route(self, points):
+        """
+        Build a straight route across the bounding box of the stoplight inventory.
+        """
+        bounds = StoplightGroup.objects.aggregate(
+            min_lat=Min("lat"), max_lat=Max("lat"), min_lng=Min("lng"), max_lng=Max("lng")
+        )
+        if bounds["min_lat"] is None:
+            return []
+
+        steps = max(points - 1, 1)
+        return [
+            [
+                bounds["min_lat"] + (bounds["max_lat"] - bounds["min_lat"]) * i / steps,
+                bounds["min_lng"] + (bounds["max_lng"] - bounds["min_lng"]) * i / steps,
+            ]
+            for i in range(steps + 1)
+        ]
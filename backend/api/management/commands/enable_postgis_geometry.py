@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Geography point column generated from the existing float fields, so the
+# lat/lng columns stay the source of truth and need no application changes.
+ENABLE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """
+    ALTER TABLE api_stoplightgroup
+    ADD COLUMN IF NOT EXISTS geom geography(Point, 4326)
+    GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lng, lat), 4326)::geography) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS api_stoplightgroup_geom_gist ON api_stoplightgroup USING GIST (geom)",
+]
+
+DISABLE_SQL = [
+    "DROP INDEX IF EXISTS api_stoplightgroup_geom_gist",
+    "ALTER TABLE api_stoplightgroup DROP COLUMN IF EXISTS geom",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Add the GiST-indexed geometry column used by the postgis stoplight matching backend. "
+        "Safe to run repeatedly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--disable",
+            action="store_true",
+            help="Drop the geometry column and its index instead.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("The postgis matching backend requires a PostgreSQL database.")
+
+        statements = DISABLE_SQL if options["disable"] else ENABLE_SQL
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+        if options["disable"]:
+            self.stdout.write("PostGIS geometry column removed.")
+        else:
+            self.stdout.write(self.style.SUCCESS("PostGIS geometry column and index are in place."))
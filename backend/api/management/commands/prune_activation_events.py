@@ -0,0 +1,35 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import ActivationEvent
+
+
+class Command(BaseCommand):
+    help = "Delete activation events older than the retention period, in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "ACTIVATION_LOG_RETENTION_DAYS", 90),
+            help="Keep events from the last N days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000, help="Rows deleted per query.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        total = 0
+
+        # Delete in batches so retention never holds long locks on the log table
+        while True:
+            ids = list(
+                ActivationEvent.objects.filter(timestamp__lt=cutoff)
+                .values_list("id", flat=True)[:options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted, _ = ActivationEvent.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        self.stdout.write(f"Deleted {total} activation events older than {cutoff:%Y-%m-%d %H:%M}.")
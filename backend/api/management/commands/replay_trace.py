@@ -0,0 +1,90 @@
+import difflib
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.proximity import update_active_groups
+from api.traces import COMMAND, END, FIX, read_trace
+
+
+class Command(BaseCommand):
+    help = "Replay recorded trace files through the proximity logic and diff the resulting stoplight commands."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Trace files to replay.")
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=0,
+            help="Playback speed relative to the recording (1 = original timing, 0 = as fast as possible).",
+        )
+
+    def handle(self, *args, **options):
+        mismatched = 0
+
+        for path in options["paths"]:
+            try:
+                trace = read_trace(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(str(e))
+
+            start = time.perf_counter()
+            replayed, fixes = self.replay(trace, options["speed"])
+            elapsed = time.perf_counter() - start
+
+            recorded = trace.commands()
+            self.stdout.write(
+                f"{path}: {fixes} fixes, {len(recorded)} recorded and {len(replayed)} replayed commands "
+                f"in {elapsed * 1000:.1f} ms"
+            )
+
+            if replayed != recorded:
+                mismatched += 1
+                diff = difflib.unified_diff(
+                    [self.format_command(c) for c in recorded],
+                    [self.format_command(c) for c in replayed],
+                    fromfile="recorded",
+                    tofile="replayed",
+                    lineterm="",
+                )
+                self.stdout.write(self.style.WARNING("\n".join(diff)))
+
+        if mismatched:
+            raise CommandError(f"{mismatched} of {len(options['paths'])} traces replayed differently.")
+        self.stdout.write(self.style.SUCCESS("All traces replayed identically."))
+
+    def replay(self, trace, speed):
+        """
+        Feed the recorded fixes through the proximity logic, mirroring ProximityConsumer.
+        Returns the emitted (group_id, stoplight_id, activate) commands and the number of fixes.
+        """
+        active_groups = set()
+        commands = []
+        fixes = 0
+        previous_elapsed = None
+
+        def emit(group_id, activate):
+            closest_stoplight = trace.closest_stoplights.get(str(group_id))
+            if closest_stoplight:
+                commands.append((group_id, closest_stoplight["stoplightID"], activate))
+
+        for elapsed, kind, _, lat, lng, _, _ in trace.records:
+            if kind == COMMAND:
+                continue
+
+            if speed > 0 and previous_elapsed is not None:
+                time.sleep(max(elapsed - previous_elapsed, 0) / speed)
+            previous_elapsed = elapsed
+
+            if kind == FIX:
+                fixes += 1
+                for group_id, activate in update_active_groups((lat, lng), trace.stoplight_groups, active_groups):
+                    emit(group_id, activate)
+            elif kind == END:
+                for group_id in list(active_groups):
+                    active_groups.remove(group_id)
+                    emit(group_id, 0)
+
+        return commands, fixes
+
+    def format_command(self, command):
+        group_id, stoplight_id, activate = command
+        return f"{'activate' if activate else 'deactivate'} group {group_id} stoplight {stoplight_id}"
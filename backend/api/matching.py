@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from geopy.distance import geodesic
+from .models import StoplightGroup, Stoplight
+
+# Radius (in meters) around the route inside which a stoplight group is considered on the corridor
+CORRIDOR_RADIUS_METERS = 20
+
+
+def match_route(coordinates, backend=None):
+    """
+    Find the stoplight groups along a route and the closest stoplight of each group.
+
+    `coordinates` is a list of [lat, lng] pairs. The backend is taken from the
+    STOPLIGHT_MATCHING_BACKEND setting unless given explicitly ("python" or "postgis").
+    Returns a tuple of (stoplight_groups, stoplights, closest_stoplights).
+    """
+    backend = backend or getattr(settings, "STOPLIGHT_MATCHING_BACKEND", "python")
+
+    if backend == "postgis":
+        check_postgis()
+        stoplight_groups = match_groups_postgis(coordinates)
+    elif backend == "python":
+        stoplight_groups = match_groups_python(coordinates)
+    else:
+        raise ValueError(f"Unknown stoplight matching backend: {backend}")
+
+    stoplights, closest_stoplights = find_closest_stoplights(stoplight_groups)
+    return stoplight_groups, stoplights, closest_stoplights
+
+
+def match_groups_python(coordinates):
+    """
+    Match stoplight groups against every route coordinate in Python using geodesic distances.
+    """
+    stoplight_groups = []
+    all_groups = list(StoplightGroup.objects.all())
+
+    for coord in coordinates:
+        lat, lng = coord
+        for group in all_groups:
+            group_location = (group.lat, group.lng)
+            distance = geodesic((lat, lng), group_location).meters
+            if distance <= CORRIDOR_RADIUS_METERS and group not in stoplight_groups:
+                stoplight_groups.append(group)
+
+    return stoplight_groups
+
+
+def match_groups_postgis(coordinates):
+    """
+    Match stoplight groups with a single ST_DWithin query against the route linestring.
+
+    Relies on the GiST-indexed `geom` column added by the enable_postgis_geometry
+    command, so the whole inventory is matched in one indexed round-trip. Groups
+    are ordered by their position along the route, like the Python backend.
+    """
+    if len(coordinates) == 1:
+        lat, lng = coordinates[0]
+        route_wkt = f"SRID=4326;POINT({float(lng)} {float(lat)})"
+        order_by = "id"
+    else:
+        points = ", ".join(f"{float(lng)} {float(lat)}" for lat, lng in coordinates)
+        route_wkt = f"SRID=4326;LINESTRING({points})"
+        order_by = "ST_LineLocatePoint(route.geog::geometry, g.geom::geometry), id"
+
+    sql = f"""
+        SELECT g.id, g.lat, g.lng
+        FROM api_stoplightgroup AS g,
+             (SELECT ST_GeogFromText(%s) AS geog) AS route
+        WHERE ST_DWithin(route.geog, g.geom, %s)
+        ORDER BY {order_by}
+    """
+    return list(StoplightGroup.objects.raw(sql, [route_wkt, CORRIDOR_RADIUS_METERS]))
+
+
+def find_closest_stoplights(stoplight_groups):
+    """
+    Collect the stoplights of the matched groups and pick the one closest to each group center.
+    """
+    stoplights = []
+    closest_stoplights = {}  # Store the closest stoplight for each group
+
+    group_ids = [group.id for group in stoplight_groups]
+    stoplights_by_group = {group_id: [] for group_id in group_ids}
+    for stoplight in Stoplight.objects.filter(group_id__in=group_ids).order_by("id"):
+        stoplights_by_group[stoplight.group_id].append(stoplight)
+
+    for group in stoplight_groups:
+        group_stoplights = stoplights_by_group[group.id]
+        stoplights.extend(group_stoplights)
+
+        # Find the closest stoplight for this group
+        if group_stoplights:
+            closest_stoplight = min(
+                group_stoplights,
+                key=lambda s: geodesic(
+                    (group.lat, group.lng), (s.lookahead_lat, s.lookahead_lng)
+                ).meters
+            )
+            closest_stoplights[group.id] = {
+                "stoplightID": closest_stoplight.id,
+                "lookahead_lat": closest_stoplight.lookahead_lat,
+                "lookahead_lng": closest_stoplight.lookahead_lng,
+            }
+
+    return stoplights, closest_stoplights
+
+
+def check_postgis():
+    """
+    Raise ImproperlyConfigured if the PostGIS backend is selected but the geometry column is missing.
+    Not cached, so disabling the column at runtime keeps producing a clear error.
+    """
+    if not postgis_available():
+        raise ImproperlyConfigured(
+            "STOPLIGHT_MATCHING_BACKEND is 'postgis' but api_stoplightgroup has no geom column. "
+            "Run `python manage.py enable_postgis_geometry` or use the 'python' backend."
+        )
+
+
+def postgis_available():
+    """
+    Return True if the database has the geometry column needed by the PostGIS backend.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'api_stoplightgroup' AND column_name = 'geom'"
+        )
+        return cursor.fetchone() is not None
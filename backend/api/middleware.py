@@ -0,0 +1,26 @@
+from urllib.parse import parse_qs
+from channels.auth import AuthMiddlewareStack
+from .route_tokens import load_route_token
+
+
+class RoutePlanTokenMiddleware:
+    """
+    Routes WebSocket connections carrying a valid `token` query parameter straight to
+    the consumers with the verified plan in scope["route_plan"], skipping the cookie,
+    session and user lookups. Connections without a valid token fall back to
+    AuthMiddlewareStack and read the plan from the session as before.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.session_stack = AuthMiddlewareStack(inner)
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get("query_string", b"").decode())
+        token = query.get("token", [""])[0]
+        route_plan = load_route_token(token) if token else None
+
+        if route_plan is None:
+            return await self.session_stack(scope, receive, send)
+
+        return await self.inner(dict(scope, route_plan=route_plan), receive, send)
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 09:12
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_remove_stoplight_lat_remove_stoplight_lng_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_id', models.BigIntegerField()),
+                ('stoplight_id', models.BigIntegerField()),
+                ('activate', models.BooleanField()),
+                ('vehicle', models.CharField(blank=True, max_length=64)),
+                ('connection', models.CharField(max_length=255)),
+                ('source', models.CharField(blank=True, max_length=20)),
+                ('timestamp', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(fields=['timestamp'], name='api_activation_ts_brin'), models.Index(fields=['group_id', 'timestamp'], name='api_activation_group_ts')],
+            },
+        ),
+    ]
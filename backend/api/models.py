@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
 
 # Create your models here.
 
@@ -20,3 +21,28 @@ class Stoplight(models.Model):
 
     def __str__(self):
         return f"Stoplight {self.id} in Group {self.group.id} pointing to ({self.lookahead_lat}, {self.lookahead_lng})"
+
+
+class ActivationEvent(models.Model):
+    # Plain integer ids instead of foreign keys so the log survives inventory changes
+    group_id = models.BigIntegerField()
+    stoplight_id = models.BigIntegerField()
+    activate = models.BooleanField()
+    # Stable vehicle ID sent by the client (?vehicle=), blank if the client sent none
+    vehicle = models.CharField(max_length=64, blank=True)
+    # Channel name of the WebSocket session that sent the command
+    connection = models.CharField(max_length=255)
+    source = models.CharField(max_length=20, blank=True)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Events are appended in time order, so a BRIN index stays tiny and keeps
+            # time-range queries and retention deletes cheap
+            BrinIndex(fields=["timestamp"], name="api_activation_ts_brin"),
+            models.Index(fields=["group_id", "timestamp"], name="api_activation_group_ts"),
+        ]
+
+    def __str__(self):
+        state = "activated" if self.activate else "deactivated"
+        return f"Stoplight {self.stoplight_id} in Group {self.group_id} {state} at {self.timestamp}"
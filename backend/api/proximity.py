@@ -0,0 +1,34 @@
+from geopy.distance import geodesic
+
+# Radius (in meters) around a stoplight group inside which its closest stoplight is activated
+ACTIVATION_RADIUS_METERS = 100
+
+
+def update_active_groups(current_location, stoplight_groups, active_groups):
+    """
+    Update `active_groups` in place for a new vehicle location.
+
+    Returns a list of (group_id, activate) changes, in stoplight group order:
+    activate is 1 when the vehicle enters a group's radius and 0 when it leaves.
+    Shared by the consumers and the trace replay tool so both behave identically.
+    """
+    changes = []
+
+    for group in stoplight_groups:
+        group_id = group["groupID"]
+        group_location = (group["lat"], group["lng"])
+        distance_to_group = geodesic(current_location, group_location).meters
+
+        if distance_to_group <= ACTIVATION_RADIUS_METERS:
+            if group_id not in active_groups:
+                # Entering the radius
+                active_groups.add(group_id)
+                changes.append((group_id, 1))
+
+        else:
+            if group_id in active_groups:
+                # Exiting the radius
+                active_groups.remove(group_id)
+                changes.append((group_id, 0))
+
+    return changes
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core import signing
+
+SALT = "api.route_plan"
+
+
+def make_route_token(stoplight_groups, closest_stoplights):
+    """
+    Sign the route plan used by the simulation consumers into a compact, URL-safe token.
+
+    Returns None if the token would be longer than ROUTE_TOKEN_MAX_LENGTH, since
+    proxies reject WebSocket upgrades with oversized URLs before the session
+    fallback can run. Clients then connect without a token.
+    """
+    token = signing.dumps(
+        {"stoplight_groups": stoplight_groups, "closest_stoplights": closest_stoplights},
+        salt=SALT,
+        compress=True,
+    )
+    if len(token) > settings.ROUTE_TOKEN_MAX_LENGTH:
+        return None
+    return token
+
+
+def load_route_token(token):
+    """
+    Verify a route token and return its plan, or None if it is invalid or expired.
+    """
+    try:
+        return signing.loads(token, salt=SALT, max_age=settings.ROUTE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
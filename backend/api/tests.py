@@ -1,3 +1,499 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from .audit import ActivationLogWriter
+from .consumers import OperatorConsumer, SimulationConsumer
+from .lifespan import lifespan_app
+from .live_status import LiveStatus
+from .matching import match_route
+from .middleware import RoutePlanTokenMiddleware
+from .models import ActivationEvent, Stoplight, StoplightGroup
+from .route_tokens import load_route_token, make_route_token
+from .traces import COMMAND, END, FIX, HEADER, MAGIC, RECORD, VERSION, TraceRecorder, read_trace
+from .views import post_route
 
-# Create your tests here.
+STOPLIGHT_GROUPS = [
+    {"groupID": 1, "lat": 14.6, "lng": 121.0},
+    {"groupID": 2, "lat": 14.61, "lng": 121.0},
+]
+CLOSEST_STOPLIGHTS = {
+    "1": {"stoplightID": 10, "lookahead_lat": 14.6001, "lookahead_lng": 121.0},
+    "2": {"stoplightID": 20, "lookahead_lat": 14.6101, "lookahead_lng": 121.0},
+}
+
+
+class MatchRouteTests(SimpleTestCase):
+    def setUp(self):
+        self.groups = [
+            StoplightGroup(id=1, lat=14.6, lng=121.0),
+            StoplightGroup(id=2, lat=14.61, lng=121.0),
+            StoplightGroup(id=3, lat=14.7, lng=121.0),  # Far from the route
+        ]
+        self.stoplights = [
+            Stoplight(id=10, group_id=1, lookahead_lat=14.6005, lookahead_lng=121.0),
+            Stoplight(id=11, group_id=1, lookahead_lat=14.6001, lookahead_lng=121.0),
+            Stoplight(id=20, group_id=2, lookahead_lat=14.6101, lookahead_lng=121.0),
+        ]
+
+        group_patcher = mock.patch("api.matching.StoplightGroup")
+        stoplight_patcher = mock.patch("api.matching.Stoplight")
+        group_model = group_patcher.start()
+        stoplight_model = stoplight_patcher.start()
+        self.addCleanup(group_patcher.stop)
+        self.addCleanup(stoplight_patcher.stop)
+
+        group_model.objects.all.return_value = self.groups
+        stoplight_model.objects.filter.side_effect = lambda group_id__in: mock.Mock(
+            order_by=lambda field: [s for s in self.stoplights if s.group_id in group_id__in]
+        )
+
+    def test_groups_follow_route_order(self):
+        # The route passes group 2 before group 1
+        groups, stoplights, _ = match_route([[14.61, 121.0], [14.605, 121.0], [14.6, 121.0]], backend="python")
+
+        self.assertEqual([group.id for group in groups], [2, 1])
+        self.assertEqual([stoplight.id for stoplight in stoplights], [20, 10, 11])
+
+    def test_closest_stoplight_per_group(self):
+        _, _, closest_stoplights = match_route([[14.6, 121.0], [14.61, 121.0]], backend="python")
+
+        self.assertEqual(closest_stoplights[1]["stoplightID"], 11)
+        self.assertEqual(closest_stoplights[2]["stoplightID"], 20)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            match_route([[14.6, 121.0]], backend="spatialite")
+
+    @mock.patch("api.matching.postgis_available", return_value=False)
+    def test_postgis_backend_without_geometry_column(self, postgis_available):
+        with self.assertRaises(ImproperlyConfigured):
+            match_route([[14.6, 121.0]], backend="postgis")
+
+    @mock.patch("api.matching.match_groups_postgis")
+    @mock.patch("api.matching.postgis_available")
+    def test_postgis_check_is_not_cached(self, postgis_available, match_groups_postgis):
+        postgis_available.return_value = True
+        match_groups_postgis.return_value = [self.groups[0]]
+        groups, _, _ = match_route([[14.6, 121.0]], backend="postgis")
+        self.assertEqual(groups, [self.groups[0]])
+
+        # The geometry column was dropped after the first successful check
+        postgis_available.return_value = False
+        with self.assertRaises(ImproperlyConfigured):
+            match_route([[14.6, 121.0]], backend="postgis")
+
+    @mock.patch("api.views.match_route", side_effect=ImproperlyConfigured("no geom column"))
+    def test_post_route_does_not_hide_misconfiguration(self, match_route):
+        request = RequestFactory().post(
+            "/api/route/", {"coordinates": [[14.6, 121.0]]}, content_type="application/json"
+        )
+
+        with self.assertRaises(ImproperlyConfigured):
+            post_route(request)
+
+
+class RecordingLogWriter(ActivationLogWriter):
+    """
+    Activation log writer that keeps written batches in memory instead of the database.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.written = []
+        self.threads = set()
+
+    def write_sync(self, batch):
+        self.written.append([event.group_id for event in batch])
+        self.threads.add(threading.current_thread().name)
+
+
+class ActivationLogWriterTests(SimpleTestCase):
+    def make_writer(self, **kwargs):
+        writer = RecordingLogWriter(**kwargs)
+        self.addCleanup(lambda: writer.task and writer.task.cancel())
+        return writer
+
+    async def test_full_batch_is_written_immediately(self):
+        writer = self.make_writer(batch_size=3, flush_interval=10)
+        for group_id in range(3):
+            writer.log(group_id, 10, 1)
+
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(writer.written, [[0, 1, 2]])
+        # Written on the dedicated thread, not asgiref's shared sync thread
+        self.assertEqual(len(writer.threads), 1)
+        self.assertTrue(writer.threads.pop().startswith("activation-log"))
+
+    async def test_partial_batch_is_written_after_flush_interval(self):
+        writer = self.make_writer(batch_size=100, flush_interval=0.05)
+        writer.log(1, 10, 1)
+        writer.log(2, 20, 1)
+
+        await asyncio.sleep(0.01)
+        self.assertEqual(writer.written, [])
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(writer.written, [[1, 2]])
+
+    async def test_events_are_dropped_when_queue_is_full(self):
+        writer = self.make_writer(max_queue_size=2)
+        for group_id in range(5):
+            writer.log(group_id, 10, 1)
+
+        self.assertEqual(writer.dropped, 3)
+        self.assertEqual(writer.queue.qsize(), 2)
+
+    async def test_close_writes_batch_in_progress_and_queue(self):
+        writer = self.make_writer(batch_size=100, flush_interval=10)
+        writer.log(1, 10, 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(writer.batch), 1)  # Collected by run(), waiting for more
+
+        writer.log(2, 20, 1)
+        writer.log(3, 30, 1)
+        await writer.close()
+
+        self.assertEqual(sorted(sum(writer.written, [])), [1, 2, 3])
+        self.assertEqual(writer.batch, [])
+        self.assertTrue(writer.queue.empty())
+        self.assertTrue(writer.task.done())
+
+    @mock.patch("api.lifespan.activation_log")
+    async def test_lifespan_shutdown_closes_the_log(self, activation_log):
+        activation_log.close = mock.AsyncMock()
+        messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        await lifespan_app({"type": "lifespan"}, receive, send)
+
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        activation_log.close.assert_awaited_once()
+
+
+class FakeActivationEvents:
+    """
+    In-memory stand-in for ActivationEvent.objects supporting the prune command's queries.
+    """
+    def __init__(self, events):
+        self.events = events
+
+    def filter(self, timestamp__lt=None, id__in=None):
+        return FakeActivationEventQuerySet(self, [
+            event for event in self.events
+            if (timestamp__lt is None or event.timestamp < timestamp__lt)
+            and (id__in is None or event.id in id__in)
+        ])
+
+
+class FakeActivationEventQuerySet:
+    def __init__(self, manager, events):
+        self.manager = manager
+        self.events = events
+
+    def values_list(self, field, flat=False):
+        return [getattr(event, field) for event in self.events]
+
+    def delete(self):
+        self.manager.events = [event for event in self.manager.events if event not in self.events]
+        return len(self.events), {}
+
+
+class PruneActivationEventsTests(SimpleTestCase):
+    def test_events_before_cutoff_are_deleted(self):
+        now = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+        cutoff = now - timedelta(days=30)
+        objects = FakeActivationEvents([
+            ActivationEvent(id=1, timestamp=cutoff - timedelta(microseconds=1)),
+            ActivationEvent(id=2, timestamp=cutoff),
+            ActivationEvent(id=3, timestamp=cutoff + timedelta(microseconds=1)),
+            ActivationEvent(id=4, timestamp=cutoff - timedelta(days=1)),
+        ])
+
+        with mock.patch("api.management.commands.prune_activation_events.ActivationEvent") as model, \
+                mock.patch("api.management.commands.prune_activation_events.timezone.now", return_value=now):
+            model.objects = objects
+            call_command("prune_activation_events", days=30, batch_size=1, stdout=StringIO())
+
+        # Events exactly at the cutoff are kept
+        self.assertEqual([event.id for event in objects.events], [2, 3])
+
+
+class TraceFormatTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_trace(self):
+        recorder = TraceRecorder.create(self.directory.name, "live", STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+        recorder.record_fix(14.6, 121.0)
+        recorder.record_command(1, 10, 1)
+        recorder.record_end()
+        recorder.close()
+        return recorder.path
+
+    def test_round_trip(self):
+        trace = read_trace(self.write_trace())
+
+        self.assertEqual(trace.stoplight_groups, STOPLIGHT_GROUPS)
+        self.assertEqual(trace.closest_stoplights, CLOSEST_STOPLIGHTS)
+        self.assertEqual([record[1] for record in trace.records], [FIX, COMMAND, END])
+        self.assertEqual(trace.records[0][3:5], (14.6, 121.0))
+        self.assertEqual(trace.commands(), [(1, 10, 1)])
+
+    def test_partial_record_is_ignored(self):
+        path = self.write_trace()
+        with open(path, "ab") as f:
+            f.write(b"\x00" * (RECORD.size // 2))
+
+        self.assertEqual(len(read_trace(path).records), 3)
+
+    def test_short_file_is_rejected(self):
+        path = os.path.join(self.directory.name, "short.trace")
+        with open(path, "wb") as f:
+            f.write(b"\x00" * (HEADER.size - 1))
+
+        with self.assertRaises(ValueError):
+            read_trace(path)
+        with self.assertRaises(CommandError):
+            call_command("replay_trace", path, stdout=StringIO())
+
+    def test_wrong_magic_is_rejected(self):
+        path = os.path.join(self.directory.name, "other.trace")
+        with open(path, "wb") as f:
+            f.write(b"\x00" * 64)
+
+        with self.assertRaises(ValueError):
+            read_trace(path)
+
+    def test_incomplete_plan_is_rejected(self):
+        path = os.path.join(self.directory.name, "no-plan.trace")
+        plan = json.dumps({"stoplight_groups": STOPLIGHT_GROUPS}).encode()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0.0, len(plan)) + plan)
+
+        with self.assertRaises(ValueError):
+            read_trace(path)
+        with self.assertRaises(CommandError):
+            call_command("replay_trace", path, stdout=StringIO())
+
+    def test_records_are_readable_before_close(self):
+        recorder = TraceRecorder.create(self.directory.name, "live", STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+        self.addCleanup(recorder.close)
+        recorder.record_fix(14.6, 121.0)
+        recorder.record_command(1, 10, 1)
+
+        self.assertEqual(read_trace(recorder.path).commands(), [(1, 10, 1)])
+
+    def test_replay_reports_mismatch(self):
+        recorder = TraceRecorder.create(self.directory.name, "live", STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+        recorder.record_fix(14.6, 121.0)
+        recorder.record_command(2, 20, 1)  # The replay activates group 1 instead
+        recorder.close()
+
+        with self.assertRaises(CommandError):
+            call_command("replay_trace", recorder.path, stdout=StringIO())
+
+
+@mock.patch("api.consumers.live_status")
+@mock.patch("api.consumers.activation_log")
+class TraceReplayTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    async def record_session(self, messages):
+        """
+        Run messages through SimulationConsumer and return the commands it sent back.
+        """
+        communicator = WebsocketCommunicator(SimulationConsumer.as_asgi(), "/ws/simulation/")
+        communicator.scope["route_plan"] = {
+            "stoplight_groups": STOPLIGHT_GROUPS,
+            "closest_stoplights": CLOSEST_STOPLIGHTS,
+        }
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        sent = []
+        for message in messages:
+            await communicator.send_to(text_data=json.dumps(message))
+            while not await communicator.receive_nothing(timeout=0.05):
+                command = json.loads(await communicator.receive_from())
+                sent.append((command["groupID"], command["stoplightID"], command["activate"]))
+
+        await communicator.disconnect()
+        return sent
+
+    async def test_replay_matches_live_session(self, activation_log, live_status):
+        messages = [
+            {"coordinates": {"lat": 14.59, "lng": 121.0}},
+            {"coordinates": {"lat": 14.6, "lng": 121.0}},
+            {"coordinates": {"lat": "14.6005", "lng": "121.0"}},  # Numeric strings are accepted
+            {"coordinates": {"lat": 14.61, "lng": 121.0}},
+            {"coordinates": {"lat": "not a number", "lng": 121.0}},  # Ignored
+            {"end_simulation": True},
+        ]
+
+        with override_settings(TRACE_RECORDING_DIR=self.directory.name):
+            sent = await self.record_session(messages)
+
+        self.assertEqual(sent, [(1, 10, 1), (1, 10, 0), (2, 20, 1), (2, 20, 0)])
+
+        [name] = os.listdir(self.directory.name)
+        trace = read_trace(os.path.join(self.directory.name, name))
+        self.assertEqual(trace.commands(), sent)
+        self.assertEqual(sum(1 for record in trace.records if record[1] == FIX), 4)
+
+        # Raises CommandError if the replayed commands differ from the recorded ones
+        call_command("replay_trace", trace.path, stdout=StringIO())
+
+
+class LiveStatusTests(SimpleTestCase):
+    def make_status(self):
+        status = LiveStatus(frame_rate=10)
+        self.addCleanup(lambda: status.task and status.task.cancel())
+        return status
+
+    def test_frame_rate_must_be_positive(self):
+        with self.assertRaises(ImproperlyConfigured):
+            LiveStatus(frame_rate=0)
+
+    async def test_sessions_sharing_a_vehicle_id_are_tracked_separately(self):
+        status = self.make_status()
+        status.update_vehicle("channel-a", "ambulance-1", "live", 14.6, 121.0)
+        status.update_vehicle("channel-b", "ambulance-1", "live", 14.61, 121.0)
+        status.update_stoplight(1, 10, "channel-a", 1)
+        status.update_stoplight(1, 10, "channel-b", 1)
+
+        # One session leaving keeps the other's position and activation
+        status.update_stoplight(1, 10, "channel-a", 0)
+        status.remove_vehicle("channel-a")
+
+        self.assertEqual(list(status.vehicles), ["channel-b"])
+        self.assertEqual(status.vehicles["channel-b"]["lat"], 14.61)
+        self.assertEqual(
+            status.intersection_state(1)["activeStoplights"],
+            [{"stoplightID": 10, "vehicles": ["channel-b"]}],
+        )
+
+    async def test_delta_only_contains_changes_since_last_frame(self):
+        status = self.make_status()
+        status.update_vehicle("channel-a", "ambulance-1", "live", 14.6, 121.0)
+        status.update_stoplight(1, 10, "channel-a", 1)
+
+        delta = status.pop_delta()
+        self.assertEqual([v["id"] for v in delta["vehicles"]], ["channel-a"])
+        self.assertEqual([i["groupID"] for i in delta["intersections"]], [1])
+        self.assertIsNone(status.pop_delta())
+
+        status.remove_vehicle("channel-a")
+        self.assertEqual(status.pop_delta()["removedVehicles"], ["channel-a"])
+
+
+class OperatorConsumerTests(SimpleTestCase):
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(OperatorConsumer.as_asgi(), "/ws/operator/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_anonymous_user_is_rejected(self):
+        _, connected = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
+
+    async def test_non_staff_user_is_rejected(self):
+        _, connected = await self.connect(mock.Mock(is_authenticated=True, is_staff=False))
+        self.assertFalse(connected)
+
+    @mock.patch.object(OperatorConsumer, "get_stoplight_groups")
+    async def test_staff_user_receives_snapshot(self, get_stoplight_groups):
+        get_stoplight_groups.return_value = [{"groupID": 1, "lat": 14.6, "lng": 121.0}]
+
+        communicator, connected = await self.connect(mock.Mock(is_authenticated=True, is_staff=True))
+        self.assertTrue(connected)
+
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["intersections"][0]["groupID"], 1)
+        await communicator.disconnect()
+
+
+class RouteTokenTests(SimpleTestCase):
+    def test_round_trip(self):
+        token = make_route_token(STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+
+        self.assertEqual(load_route_token(token), {
+            "stoplight_groups": STOPLIGHT_GROUPS,
+            "closest_stoplights": CLOSEST_STOPLIGHTS,
+        })
+
+    def test_expired_token_is_rejected(self):
+        token = make_route_token(STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+
+        with override_settings(ROUTE_TOKEN_MAX_AGE=-1):
+            self.assertIsNone(load_route_token(token))
+
+    def test_tampered_token_is_rejected(self):
+        token = make_route_token(STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+        value, signature = token.rsplit(":", 1)
+        tampered = f"{value}:{signature[::-1]}"
+
+        self.assertIsNone(load_route_token(tampered))
+        self.assertIsNone(load_route_token("not-a-token"))
+
+    def test_oversized_plan_gets_no_token(self):
+        with override_settings(ROUTE_TOKEN_MAX_LENGTH=64):
+            self.assertIsNone(make_route_token(STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS))
+
+
+class RoutePlanTokenMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+
+        async def inner(scope, receive, send):
+            self.calls.append(("token", scope))
+
+        async def session_stack(scope, receive, send):
+            self.calls.append(("session", scope))
+
+        self.middleware = RoutePlanTokenMiddleware(inner)
+        self.middleware.session_stack = session_stack
+
+    async def connect(self, query_string):
+        await self.middleware({"type": "websocket", "query_string": query_string}, None, None)
+        [call] = self.calls
+        return call
+
+    async def test_valid_token_skips_the_session(self):
+        token = make_route_token(STOPLIGHT_GROUPS, CLOSEST_STOPLIGHTS)
+
+        route, scope = await self.connect(f"token={token}&vehicle=ambulance-1".encode())
+
+        self.assertEqual(route, "token")
+        self.assertEqual(scope["route_plan"]["stoplight_groups"], STOPLIGHT_GROUPS)
+
+    async def test_missing_token_falls_back_to_the_session(self):
+        route, scope = await self.connect(b"vehicle=ambulance-1")
+
+        self.assertEqual(route, "session")
+        self.assertNotIn("route_plan", scope)
+
+    async def test_invalid_token_falls_back_to_the_session(self):
+        route, _ = await self.connect(b"token=forged")
+
+        self.assertEqual(route, "session")
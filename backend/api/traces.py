@@ -0,0 +1,119 @@
+import json
+import mmap
+import os
+import struct
+import time
+import uuid
+from datetime import datetime, timezone
+
+# File layout: a header, the JSON route plan the session used, then fixed-size records.
+# Header: magic, format version, session start (unix time), route plan length in bytes
+HEADER = struct.Struct("<4sHdI")
+# Record: seconds since session start, kind, activate flag, padding, lat, lng, group ID, stoplight ID
+RECORD = struct.Struct("<dBB6xddqq")
+
+MAGIC = b"TRC1"
+VERSION = 1
+
+FIX = 0  # Vehicle location (lat, lng)
+COMMAND = 1  # Stoplight command sent to the frontend and ESP32 group (group ID, stoplight ID, activate)
+END = 2  # All stoplights deactivated (end of simulation or disconnect)
+
+
+class TraceRecorder:
+    """
+    Appends the fixes and stoplight commands of one WebSocket session to a trace file.
+    """
+
+    def __init__(self, path, stoplight_groups, closest_stoplights):
+        self.path = path
+        self.start = time.monotonic()
+        plan = json.dumps({
+            "stoplight_groups": stoplight_groups,
+            "closest_stoplights": closest_stoplights,
+        }).encode()
+
+        # Unbuffered, so every record reaches the file immediately and a crashed or
+        # still running session can be read back in full
+        self.file = open(path, "xb", buffering=0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, time.time(), len(plan)) + plan)
+
+    @classmethod
+    def create(cls, directory, source, stoplight_groups, closest_stoplights):
+        """
+        Start a new trace file with a unique name in `directory`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{source}-{uuid.uuid4().hex[:8]}.trace"
+        return cls(os.path.join(directory, name), stoplight_groups, closest_stoplights)
+
+    def write(self, kind, activate=0, lat=0.0, lng=0.0, group_id=0, stoplight_id=0):
+        if self.file.closed:
+            return
+        elapsed = time.monotonic() - self.start
+        self.file.write(RECORD.pack(elapsed, kind, activate, lat, lng, group_id, stoplight_id))
+
+    def record_fix(self, lat, lng):
+        self.write(FIX, lat=lat, lng=lng)
+
+    def record_command(self, group_id, stoplight_id, activate):
+        self.write(COMMAND, activate=activate, group_id=group_id, stoplight_id=stoplight_id)
+
+    def record_end(self):
+        self.write(END)
+
+    def close(self):
+        self.file.close()
+
+
+class Trace:
+    """
+    A recorded session read back from a trace file.
+
+    `records` is a list of (elapsed, kind, activate, lat, lng, group_id, stoplight_id) tuples.
+    """
+
+    def __init__(self, path, started_at, stoplight_groups, closest_stoplights, records):
+        self.path = path
+        self.started_at = started_at
+        self.stoplight_groups = stoplight_groups
+        self.closest_stoplights = closest_stoplights
+        self.records = records
+
+    def commands(self):
+        """
+        Return the recorded stoplight commands as (group_id, stoplight_id, activate) tuples.
+        """
+        return [
+            (group_id, stoplight_id, activate)
+            for _, kind, activate, _, _, group_id, stoplight_id in self.records
+            if kind == COMMAND
+        ]
+
+
+def read_trace(path):
+    """
+    Memory-map a trace file and decode its header, route plan and records.
+    A partially written record at the end of the file is ignored.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < HEADER.size:
+            raise ValueError(f"{path} is too short to be a trace file.")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, started_at, plan_length = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} trace file.")
+
+            plan_end = HEADER.size + plan_length
+            if len(mm) < plan_end:
+                raise ValueError(f"{path} has a truncated route plan.")
+            plan = json.loads(mm[HEADER.size:plan_end])
+            if not isinstance(plan, dict) or not {"stoplight_groups", "closest_stoplights"} <= plan.keys():
+                raise ValueError(f"{path} has an incomplete route plan.")
+
+            record_bytes = (len(mm) - plan_end) // RECORD.size * RECORD.size
+            with memoryview(mm)[plan_end:plan_end + record_bytes] as view:
+                records = list(RECORD.iter_unpack(view))
+
+    return Trace(path, started_at, plan["stoplight_groups"], plan["closest_stoplights"], records)
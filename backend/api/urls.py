@@ -1,5 +1,5 @@
 from django.urls import path
-from .consumers import SimulationConsumer, ESP32Consumer, LiveSimulationConsumer
+from .consumers import SimulationConsumer, ESP32Consumer, LiveSimulationConsumer, OperatorConsumer
 from .views import post_route, get_stoplights
 
 # Define an empty urlpatterns for HTTP routes (if needed in the future)
@@ -13,4 +13,5 @@ websocket_urlpatterns = [
     path('ws/simulation/', SimulationConsumer.as_asgi()),  # For simulation
     path('ws/esp32/', ESP32Consumer.as_asgi()),            # For ESP32 connection
     path('ws/live/', LiveSimulationConsumer.as_asgi()),
+    path('ws/operator/', OperatorConsumer.as_asgi()),     # For dispatcher dashboards
 ]
\ No newline at end of file
@@ -1,8 +1,9 @@
 from django.shortcuts import render
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import StoplightGroup, Stoplight
-from geopy.distance import geodesic
+from .matching import match_route
+from .route_tokens import make_route_token
 
 
 @api_view(['POST'])
@@ -14,37 +15,8 @@ def post_route(request):
         if not coordinates:
             return Response({"error": "No coordinates provided."}, status=400)
 
-        # Find stoplight groups within a 20-meter radius
-        stoplight_groups = []
-        stoplights = []
-        closest_stoplights = {}  # Store the closest stoplight for each group
-
-        for coord in coordinates:
-            lat, lng = coord
-            for group in StoplightGroup.objects.all():
-                group_location = (group.lat, group.lng)
-                distance = geodesic((lat, lng), group_location).meters
-                if distance <= 20 and group not in stoplight_groups:
-                    stoplight_groups.append(group)
-
-        # Collect only the stoplights that belong to the stoplight_groups
-        for group in stoplight_groups:
-            group_stoplights = Stoplight.objects.filter(group=group)
-            stoplights.extend(group_stoplights)
-
-            # Find the closest stoplight for this group
-            if group_stoplights:
-                closest_stoplight = min(
-                    group_stoplights,
-                    key=lambda s: geodesic(
-                        (group.lat, group.lng), (s.lookahead_lat, s.lookahead_lng)
-                    ).meters
-                )
-                closest_stoplights[group.id] = {
-                    "stoplightID": closest_stoplight.id,
-                    "lookahead_lat": closest_stoplight.lookahead_lat,
-                    "lookahead_lng": closest_stoplight.lookahead_lng,
-                }
+        # Find stoplight groups along the route and the closest stoplight of each group
+        stoplight_groups, stoplights, closest_stoplights = match_route(coordinates)
 
         # Serialize the stoplight group details and store them in the session
         serialized_groups = [
@@ -55,7 +27,7 @@ def post_route(request):
         serialized_stoplights = [
             {
                 "stoplightID": stoplight.id,
-                "groupID": stoplight.group.id,
+                "groupID": stoplight.group_id,
                 "lookahead_lat": stoplight.lookahead_lat,
                 "lookahead_lng": stoplight.lookahead_lng,
             }
@@ -66,7 +38,14 @@ def post_route(request):
         request.session["stoplights"] = serialized_stoplights
         request.session["closest_stoplights"] = closest_stoplights  # Store closest stoplights
         request.session.save()
-        return Response({"success": True})
+
+        # Signed copy of the plan so the WebSocket consumers can skip the session lookup,
+        # None for routes too long to fit in a WebSocket URL
+        token = make_route_token(serialized_groups, closest_stoplights)
+        return Response({"success": True, "token": token})
+    except ImproperlyConfigured:
+        # Server misconfiguration, not a bad request
+        raise
     except Exception as e:
         return Response({"error": str(e)}, status=400)
 
@@ -8,12 +8,14 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()  # Initialize Django BEFORE importing any models
 
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from api.lifespan import lifespan_app
+from api.middleware import RoutePlanTokenMiddleware
 from api.urls import websocket_urlpatterns  # Safe now
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "websocket": RoutePlanTokenMiddleware(
         URLRouter(websocket_urlpatterns)
     ),
+    "lifespan": lifespan_app,  # Flushes the activation log on shutdown
 })
\ No newline at end of file
@@ -131,6 +131,11 @@ USE_TZ = True
 
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
+# Backend used by post_route to match stoplight groups along a route:
+# "python" (geodesic distances in Python) or "postgis" (single ST_DWithin query,
+# requires the PostGIS extension; run `manage.py enable_postgis_geometry` first)
+STOPLIGHT_MATCHING_BACKEND = config('STOPLIGHT_MATCHING_BACKEND', default='python')
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
@@ -166,6 +171,26 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Activation audit log: events are batched in memory and written with bulk_create
+# every ACTIVATION_LOG_BATCH_SIZE events or ACTIVATION_LOG_FLUSH_INTERVAL_MS milliseconds
+ACTIVATION_LOG_BATCH_SIZE = config('ACTIVATION_LOG_BATCH_SIZE', default=500, cast=int)
+ACTIVATION_LOG_FLUSH_INTERVAL_MS = config('ACTIVATION_LOG_FLUSH_INTERVAL_MS', default=500, cast=int)
+# Events older than this are removed by the prune_activation_events command
+ACTIVATION_LOG_RETENTION_DAYS = config('ACTIVATION_LOG_RETENTION_DAYS', default=90, cast=int)
+
+# Directory where simulation and live sessions are recorded as trace files for
+# the replay_trace command. Recording is disabled when empty.
+TRACE_RECORDING_DIR = config('TRACE_RECORDING_DIR', default='')
+
+# Maximum number of status deltas per second sent to operator dashboards on /ws/operator/
+OPERATOR_STATUS_FRAME_RATE = config('OPERATOR_STATUS_FRAME_RATE', default=2, cast=float)
+
+# Lifetime in seconds of the signed route tokens returned by post_route
+ROUTE_TOKEN_MAX_AGE = config('ROUTE_TOKEN_MAX_AGE', default=6 * 60 * 60, cast=int)
+# Longer tokens are not issued and clients fall back to the session, keeping the
+# WebSocket URL well under the usual 8 KB request line limit of proxies
+ROUTE_TOKEN_MAX_LENGTH = config('ROUTE_TOKEN_MAX_LENGTH', default=4096, cast=int)
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
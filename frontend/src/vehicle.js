@@ -0,0 +1,10 @@
+// Stable ID for this device, sent with every WebSocket connection so the
+// backend's activation log can tell which vehicle triggered each stoplight
+export function getVehicleId() {
+  let vehicleId = localStorage.getItem("vehicleId");
+  if (!vehicleId) {
+    vehicleId = crypto.randomUUID();
+    localStorage.setItem("vehicleId", vehicleId);
+  }
+  return vehicleId;
+}
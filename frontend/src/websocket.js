@@ -0,0 +1,19 @@
+import { getVehicleId } from "@/vehicle";
+
+// Keep the signed route plan from the backend; routes too long to fit in a
+// WebSocket URL get no token and fall back to the session cookie
+export function saveRouteToken(token) {
+  if (token) {
+    sessionStorage.setItem("routeToken", token);
+  } else {
+    sessionStorage.removeItem("routeToken");
+  }
+}
+
+// Query string for the simulation and live WebSockets
+export function simulationQuery() {
+  const params = new URLSearchParams({ vehicle: getVehicleId() });
+  const token = sessionStorage.getItem("routeToken");
+  if (token) params.set("token", token);
+  return params.toString();
+}